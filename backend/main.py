@@ -1,11 +1,13 @@
 """ThesisCheck Backend - FastAPI application entry point."""
 
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from routers import export, review, rewrite
+from services import llm_service
 
 # Configure logging
 logging.basicConfig(
@@ -13,10 +15,19 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan: close pooled LLM clients on shutdown."""
+    yield
+    await llm_service.close_clients()
+
+
 app = FastAPI(
     title="ThesisCheck API",
     description="LLM-powered thesis review backend for the Word Add-in",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration for Office Add-in
@@ -32,8 +43,10 @@ app.add_middleware(
         "null",  # Office Add-in taskpane may send origin as 'null'
     ],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Explicit lists let preflight checks use plain set lookups instead of
+    # echoing back whatever the browser asked for
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
 )
 
 # Register routers
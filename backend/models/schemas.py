@@ -1,11 +1,14 @@
 """Pydantic schemas for request/response models."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class ParagraphData(BaseModel):
     """Single paragraph from the document."""
 
+    # Request data is read-only once parsed
+    model_config = ConfigDict(frozen=True)
+
     index: int
     text: str
 
@@ -13,6 +16,8 @@ class ParagraphData(BaseModel):
 class ReviewRequest(BaseModel):
     """Request body for review endpoints."""
 
+    model_config = ConfigDict(frozen=True)
+
     paragraphs: list[ParagraphData]
     api_key: str
     base_url: str
@@ -6,8 +6,16 @@ Contains three sets of prompts:
 3. THESIS_COMMENT - for overall thesis evaluation (outputs plain text)
 """
 
+import hashlib
 import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Iterable
 from dataclasses import dataclass, field
+from itertools import accumulate
+
+from models.schemas import ParagraphData
 
 
 # ---------------------------------------------------------------------------
@@ -17,14 +25,54 @@ from dataclasses import dataclass, field
 
 @dataclass
 class Section:
-    """Represents a detected section/chapter in the thesis."""
+    """Represents a detected section/chapter in the thesis.
+
+    A section is a range over the document's paragraph lists, which are
+    shared by all sections of the document rather than copied.
+    """
 
     name: str
     section_type: str  # "cover", "abstract", "chapter", "references", "appendix"
-    start_para_idx: int  # index into the original paragraph list
-    end_para_idx: int  # inclusive
-    paragraphs: list[dict] = field(default_factory=list)
+    start_pos: int  # position in the shared paragraph lists
+    end_pos: int  # exclusive
+    # Paragraph texts and original indices of the whole document
+    all_texts: list[str] = field(repr=False, compare=False)
+    all_indices: list[int] = field(repr=False, compare=False)
+    # Prompt text for the paragraphs, filled by detect_sections
+    formatted_text: str = field(default="", repr=False)
+    # Built review messages keyed by (outline, batch_index, total_batches)
+    cached_messages: dict[tuple[str, int, int], list[dict]] = field(
+        default_factory=dict, repr=False
+    )
+
+    @property
+    def start_para_idx(self) -> int:
+        """Original index of the first paragraph."""
+        return self.all_indices[self.start_pos]
+
+    @property
+    def end_para_idx(self) -> int:
+        """Original index of the last paragraph (inclusive)."""
+        return self.all_indices[self.end_pos - 1]
+
+    @property
+    def para_count(self) -> int:
+        """Number of paragraphs in the section."""
+        return self.end_pos - self.start_pos
+
+    @property
+    def texts(self) -> list[str]:
+        """Paragraph texts of the section."""
+        return self.all_texts[self.start_pos : self.end_pos]
 
+    @property
+    def indices(self) -> list[int]:
+        """Original paragraph indices of the section."""
+        return self.all_indices[self.start_pos : self.end_pos]
+
+
+# Translation table deleting ASCII control characters (\x00-\x1f)
+_CTRL_TBL = dict.fromkeys(range(0x20), None)
 
 # Regex patterns for detecting section headers in Chinese theses
 _SECTION_PATTERNS = [
@@ -59,6 +107,37 @@ _SECTION_PATTERNS = [
     (r"^(\u76ee\s*\u5f55)$", "toc"),
 ]
 
+# All section patterns fused into one alternation so each paragraph is
+# scanned once. Alternatives are tried left to right, which preserves the
+# priority order of _SECTION_PATTERNS; group "g{i}" maps to _SECTION_TYPES[i].
+_COMBINED_SECTION_RE = re.compile(
+    "|".join(
+        f"(?P<g{i}>{pattern})" for i, (pattern, _) in enumerate(_SECTION_PATTERNS)
+    )
+)
+_SECTION_TYPES = [section_type for _, section_type in _SECTION_PATTERNS]
+
+# Table-of-contents heading with whitespace removed ("目  录" -> "目录")
+_TOC_HEADINGS = frozenset(["目录"])
+
+# Headings that are a fixed word, looked up before running the regex.
+# Every key is matched by its _SECTION_PATTERNS entry (and no earlier one),
+# so a hit gives the same type; spaced variants like "摘  要" miss here and
+# are still caught by the regex.
+_LITERAL_HEADINGS: dict[str, str] = {
+    "摘要": "abstract",
+    "ABSTRACT": "abstract",
+    "Abstract": "abstract",
+    "绪论": "chapter",
+    "引言": "chapter",
+    "导论": "chapter",
+    "结论": "chapter",
+    "总结": "chapter",
+    "参考文献": "references",
+    "致谢": "appendix",
+    "附录": "appendix",
+}
+
 # Review focus by section type
 SECTION_REVIEW_FOCUS: dict[str, str] = {
     "cover": (
@@ -113,37 +192,53 @@ SECTION_REVIEW_FOCUS: dict[str, str] = {
 }
 
 
-def _is_toc_entry(text: str) -> bool:
-    """Check if a paragraph looks like a table-of-contents entry.
+# Table-of-contents entry markers, fused into one alternation. Patterns
+# anchored at the paragraph end accept "\x00" as well, which is the
+# separator used by _find_toc_entries and cannot be matched by any
+# alternative, so a match never spans two paragraphs.
+#
+# The lookbehinds start a match only at the first tab or dot of a run and
+# the quantifiers are possessive (their classes are disjoint, so giving
+# characters back could never help). Without them a long run of dots or
+# tabs backtracks quadratically. This keeps the search linear like a DFA
+# engine would; RE2 itself is not an option, as its \s and \d are
+# ASCII-only and would miss full-width spaces and digits.
+_TOC_ENTRY_RE = re.compile(
+    # Tab + digits (page number), e.g. "一、绪论\t3"
+    r"(?<!\t)\t\s*+\d++\s*+(?:\x00|$)"
+    # Multiple dots leading to page number, e.g. "一、绪论......3"
+    r"|(?<![.。])[.。]{3,}+\s*+\d++\s*+(?:\x00|$)"
+    # Word field codes of an auto-generated TOC
+    r"|PAGEREF|HYPERLINK"
+    # Word field chars (\x13 field start, \x14 separator, \x15 field end)
+    r"|[\x13\x14\x15]"
+    # Page number preceded by control char \x05 (Word bookmark)
+    r"|\x05\s*+\d++\s*+(?:\x00|$)"
+)
+
+
+def _find_toc_entries(texts: list[str]) -> bytearray:
+    """Flag which paragraphs look like table-of-contents entries.
 
     TOC entries typically have a tab character followed by a page number,
     e.g. "一、绪论\t3" or "二、文献综述\t5".
     Word-generated TOC entries may also contain field codes (control chars
     like \\x05, \\x13-\\x15) or PAGEREF/HYPERLINK markers.
 
+    The texts are joined with "\\x00" and searched in a single pass; each
+    match is mapped back to its paragraph via the paragraph start offsets.
+
     Args:
-        text: Stripped paragraph text.
+        texts: Stripped paragraph texts.
 
     Returns:
-        True if this looks like a TOC entry.
+        One flag per paragraph, set if it looks like a TOC entry.
     """
-    # Contains tab + digits (page number) pattern
-    if re.search(r"\t\s*\d+\s*$", text):
-        return True
-    # Contains multiple dots or dashes leading to page number (e.g. "一、绪论......3")
-    if re.search(r"[.。]{3,}\s*\d+\s*$", text):
-        return True
-    # Word field codes: contains PAGEREF or HYPERLINK (auto-generated TOC)
-    if "PAGEREF" in text or "HYPERLINK" in text:
-        return True
-    # Contains Word field separator chars (\x13 field start, \x14 separator,
-    # \x15 field end) -- these appear in Word TOC entries
-    if re.search(r"[\x13\x14\x15]", text):
-        return True
-    # Ends with a page number preceded by control char \x05 (Word bookmark)
-    if re.search(r"\x05\s*\d+\s*$", text):
-        return True
-    return False
+    starts: list[int] = list(accumulate((len(t) + 1 for t in texts[:-1]), initial=0))
+    flags = bytearray(len(texts))
+    for match in _TOC_ENTRY_RE.finditer("\x00".join(texts)):
+        flags[bisect_right(starts, match.start()) - 1] = 1
+    return flags
 
 
 def _is_heading_paragraph(text: str) -> bool:
@@ -161,7 +256,7 @@ def _is_heading_paragraph(text: str) -> bool:
         True if the text looks like a genuine section heading.
     """
     # Remove control characters before checking
-    clean = re.sub(r"[\x00-\x1f]", "", text)
+    clean = text.translate(_CTRL_TBL)
     # Real headings don't contain sentence-ending punctuation
     if "\u3002" in clean:  # Chinese period
         return False
@@ -169,6 +264,14 @@ def _is_heading_paragraph(text: str) -> bool:
     return len(clean) <= 60
 
 
+# Everything _normalize_section_name strips, in one pass: a tab + page
+# number suffix, trailing page numbers, control characters and whitespace.
+# Applying the alternatives together matches applying them one after
+# another for names without control characters, which holds for section
+# names as they are taken from control-stripped heading text.
+_NORMALIZE_RE = re.compile(r"\t.*$|\s*\d+\s*$|[\x00-\x1f]|\s+")
+
+
 def _normalize_section_name(name: str) -> str:
     """Normalize a section name for deduplication comparison.
 
@@ -180,86 +283,147 @@ def _normalize_section_name(name: str) -> str:
     Returns:
         Normalized name string.
     """
-    # Remove tab + page number suffix
-    n = re.sub(r"\t.*$", "", name)
-    # Remove trailing numbers (page numbers)
-    n = re.sub(r"\s*\d+\s*$", "", n)
-    # Remove control characters
-    n = re.sub(r"[\x00-\x1f]", "", n)
-    # Collapse whitespace
-    n = re.sub(r"\s+", "", n)
-    return n.strip()
-
-
-def detect_sections(paragraphs: list[dict]) -> list[Section]:
+    return _NORMALIZE_RE.sub("", name).strip()
+
+
+# Sections of recently reviewed documents, keyed by paragraphs_digest.
+# Clients retrying a dropped stream resend the same paragraphs.
+_SECTIONS_CACHE_SIZE = 32
+_sections_cache: OrderedDict[bytes, list[Section]] = OrderedDict()
+# detect_sections may run in worker threads (see llm_service)
+_sections_cache_lock = threading.Lock()
+# Inputs this small (typically a selection review) are detected directly:
+# hashing costs about as much as the scan, and caching them would evict
+# whole documents
+_MIN_CACHED_PARAS = 10
+
+
+def paragraphs_digest(texts: list[str], indices: list[int]) -> bytes:
+    """Hash paragraph texts and indices into a compact cache key.
+
+    Args:
+        texts: Paragraph texts in document order.
+        indices: Original paragraph indices, parallel to ``texts``.
+
+    Returns:
+        16-byte digest identifying the document content.
+    """
+    # Text lengths and indices go first, on one line of digits and
+    # separators, so the joined texts that follow split only one way
+    # and indices of any size are accepted
+    header = ",".join(map(str, map(len, texts))) + ";" + ",".join(map(str, indices)) + "\n"
+    h = hashlib.blake2b(digest_size=16)
+    h.update(header.encode("ascii"))
+    h.update("\x00".join(texts).encode("utf-8", "surrogatepass"))
+    return h.digest()
+
+
+def detect_sections(
+    texts: list[str],
+    indices: list[int],
+    digest: bytes | None = None,
+) -> list[Section]:
     """Detect chapter/section boundaries from paragraph list.
 
     Applies filtering to avoid treating TOC entries, long paragraph
     descriptions, and duplicate chapter references as section boundaries.
+    Results for the most recently seen documents are cached, so the
+    returned Section objects may be shared between calls. Each section's
+    prompt text is formatted here as well, so building review messages
+    does no per-paragraph work.
 
     Args:
-        paragraphs: List of paragraph dicts with 'index' and 'text' keys.
+        texts: Paragraph texts in document order.
+        indices: Original paragraph indices, parallel to ``texts``.
+        digest: paragraphs_digest of the paragraphs, if already computed.
 
     Returns:
         List of Section objects representing detected document sections.
     """
-    if not paragraphs:
+    cached = len(texts) >= _MIN_CACHED_PARAS
+    if cached:
+        key = digest or paragraphs_digest(texts, indices)
+        with _sections_cache_lock:
+            sections = _sections_cache.get(key)
+            if sections is not None:
+                _sections_cache.move_to_end(key)
+                return list(sections)
+
+    sections = _detect_sections(texts, indices)
+    for sec in sections:
+        sec.formatted_text = format_paragraphs_for_prompt(
+            sec.texts, sec.indices
+        )
+    if not cached:
+        return sections
+    with _sections_cache_lock:
+        _sections_cache[key] = sections
+        if len(_sections_cache) > _SECTIONS_CACHE_SIZE:
+            _sections_cache.popitem(last=False)
+    return list(sections)
+
+
+def _detect_sections(texts: list[str], indices: list[int]) -> list[Section]:
+    """Uncached implementation of detect_sections."""
+    if not texts:
         return []
 
-    # Track whether we are inside a TOC region
-    in_toc = False
+    stripped_texts: list[str] = [t.strip() for t in texts]
+    toc_flags: bytearray = _find_toc_entries(stripped_texts)
 
     # First pass: find all section boundary indices
     boundaries: list[tuple[int, str, str]] = []  # (list_pos, name, type)
 
-    for pos, p in enumerate(paragraphs):
-        raw_text = p["text"].strip()
+    # Bind lookups used on every paragraph to locals
+    add_boundary = boundaries.append
+    translate = str.translate
+    ctrl_tbl = _CTRL_TBL
+    toc_headings = _TOC_HEADINGS
+    literal_heading = _LITERAL_HEADINGS.get
+    match_section = _COMBINED_SECTION_RE.match
+
+    for pos, raw_text in enumerate(stripped_texts):
         if not raw_text:
             continue
 
         # Clean control characters for pattern matching, but keep
         # the raw text for TOC entry detection (which relies on them)
-        clean_text = re.sub(r"[\x00-\x1f]", "", raw_text).strip()
+        clean_text: str = translate(raw_text, ctrl_tbl).strip()
         if not clean_text:
             continue
 
-        # Check for TOC heading (目录)
-        toc_match = re.match(r"^(目\s*录)$", clean_text)
-        if toc_match:
-            in_toc = True
-            boundaries.append((pos, clean_text, "toc"))
+        # Check for TOC heading (目录); the first-character test avoids
+        # building the whitespace-free copy for almost every paragraph
+        if clean_text[0] == "目" and "".join(clean_text.split()) in toc_headings:
+            add_boundary((pos, clean_text, "toc"))
             continue
 
-        # If inside a TOC region, check if this is a TOC entry
-        if in_toc:
-            if _is_toc_entry(raw_text):
-                # This is a TOC line, skip it (it stays in the toc section)
-                continue
-            else:
-                # We've left the TOC region -- continue to process
-                # this paragraph normally (it might be a real heading)
-                in_toc = False
+        # Skip TOC lines (they stay in the toc section), both inside an
+        # explicit TOC region and outside one (e.g. no "目录" heading)
+        if toc_flags[pos]:
+            continue
 
-        # Skip paragraphs that look like TOC entries even outside
-        # an explicit TOC region (e.g. no "目录" heading detected)
-        if _is_toc_entry(raw_text):
+        # Fixed-word headings are short, so they skip the heading check
+        section_type: str | None = literal_heading(clean_text)
+        if section_type is not None:
+            add_boundary((pos, clean_text, section_type))
             continue
 
-        for pattern, section_type in _SECTION_PATTERNS:
-            match = re.match(pattern, clean_text)
-            if match:
-                # Skip long paragraphs that start with chapter patterns --
-                # these are thesis-structure descriptions, not headings
-                if section_type == "chapter" and not _is_heading_paragraph(
-                    clean_text
-                ):
-                    break
-                boundaries.append((pos, clean_text, section_type))
-                break
+        match = match_section(clean_text)
+        if match:
+            # The outer named group closes last, so lastgroup is "g{i}"
+            section_type = _SECTION_TYPES[int(match.lastgroup[1:])]
+            # Skip long paragraphs that start with chapter patterns --
+            # these are thesis-structure descriptions, not headings
+            if section_type == "chapter" and not _is_heading_paragraph(
+                clean_text
+            ):
+                continue
+            add_boundary((pos, clean_text, section_type))
 
     # If no sections detected, use fallback chunking
     if not boundaries:
-        return _fallback_chunking(paragraphs)
+        return _fallback_chunking(texts, indices)
 
     # Build sections from boundaries
     sections: list[Section] = []
@@ -267,17 +431,16 @@ def detect_sections(paragraphs: list[dict]) -> list[Section]:
     # Handle cover: paragraphs before the first detected boundary
     first_boundary_pos = boundaries[0][0]
     if first_boundary_pos > 0:
-        cover_paras = paragraphs[:first_boundary_pos]
-        if cover_paras:
-            sections.append(
-                Section(
-                    name="封面与题目",
-                    section_type="cover",
-                    start_para_idx=cover_paras[0]["index"],
-                    end_para_idx=cover_paras[-1]["index"],
-                    paragraphs=cover_paras,
-                )
+        sections.append(
+            Section(
+                name="封面与题目",
+                section_type="cover",
+                start_pos=0,
+                end_pos=first_boundary_pos,
+                all_texts=texts,
+                all_indices=indices,
             )
+        )
 
     # Build each section from boundary to next boundary
     for i, (pos, name, sec_type) in enumerate(boundaries):
@@ -285,19 +448,18 @@ def detect_sections(paragraphs: list[dict]) -> list[Section]:
         if i + 1 < len(boundaries):
             end_pos = boundaries[i + 1][0]  # exclusive
         else:
-            end_pos = len(paragraphs)  # until end
-
-        section_paras = paragraphs[pos:end_pos]
-        if section_paras:
-            sections.append(
-                Section(
-                    name=name,
-                    section_type=sec_type,
-                    start_para_idx=section_paras[0]["index"],
-                    end_para_idx=section_paras[-1]["index"],
-                    paragraphs=section_paras,
-                )
+            end_pos = len(texts)  # until end
+
+        sections.append(
+            Section(
+                name=name,
+                section_type=sec_type,
+                start_pos=pos,
+                end_pos=end_pos,
+                all_texts=texts,
+                all_indices=indices,
             )
+        )
 
     # Merge small adjacent sections of the same type
     sections = _merge_small_sections(sections)
@@ -309,29 +471,31 @@ def detect_sections(paragraphs: list[dict]) -> list[Section]:
 
 
 def _fallback_chunking(
-    paragraphs: list[dict],
+    texts: list[str],
+    indices: list[int],
     max_paras_per_batch: int = 30,
 ) -> list[Section]:
     """Fallback: split paragraphs into fixed-size chunks when no chapters found.
 
     Args:
-        paragraphs: All paragraphs.
+        texts: All paragraph texts.
+        indices: Original paragraph indices, parallel to ``texts``.
         max_paras_per_batch: Max paragraphs per chunk.
 
     Returns:
         List of Section objects.
     """
     sections: list[Section] = []
-    for i in range(0, len(paragraphs), max_paras_per_batch):
-        chunk = paragraphs[i : i + max_paras_per_batch]
+    for i in range(0, len(texts), max_paras_per_batch):
         batch_num = i // max_paras_per_batch + 1
         sections.append(
             Section(
                 name=f"第{batch_num}部分",
                 section_type="chapter",
-                start_para_idx=chunk[0]["index"],
-                end_para_idx=chunk[-1]["index"],
-                paragraphs=chunk,
+                start_pos=i,
+                end_pos=min(i + max_paras_per_batch, len(texts)),
+                all_texts=texts,
+                all_indices=indices,
             )
         )
     return sections
@@ -357,12 +521,12 @@ def _merge_small_sections(
     for sec in sections:
         if (
             merged
-            and len(sec.paragraphs) < min_paragraphs
+            and sec.para_count < min_paragraphs
             and sec.section_type == merged[-1].section_type
         ):
-            # Merge into previous section
-            merged[-1].paragraphs.extend(sec.paragraphs)
-            merged[-1].end_para_idx = sec.end_para_idx
+            # Merge into previous section; sections are contiguous, so
+            # widening its range is enough
+            merged[-1].end_pos = sec.end_pos
             merged[-1].name = f"{merged[-1].name} / {sec.name}"
         else:
             merged.append(sec)
@@ -386,28 +550,27 @@ def _deduplicate_sections(sections: list[Section]) -> list[Section]:
     if len(sections) <= 1:
         return sections
 
-    # Group sections by normalized name
-    from collections import defaultdict
-
-    name_groups: dict[str, list[int]] = defaultdict(list)
+    # Single pass keeping, per normalized name, the section with the most
+    # paragraphs seen so far (the earliest one on ties)
+    best: dict[str, tuple[int, int]] = {}  # norm_name -> (idx, para_count)
+    keep = [True] * len(sections)
     for idx, sec in enumerate(sections):
         norm = _normalize_section_name(sec.name)
-        if norm:
-            name_groups[norm].append(idx)
-
-    # Determine which indices to remove
-    remove_indices: set[int] = set()
-    for norm_name, indices in name_groups.items():
-        if len(indices) <= 1:
+        if not norm:
             continue
-        # Keep the section with the most paragraphs, remove the rest
-        best_idx = max(indices, key=lambda i: len(sections[i].paragraphs))
-        for idx in indices:
-            if idx != best_idx:
-                remove_indices.add(idx)
+        para_count = sec.para_count
+        if norm in best:
+            prev_idx, prev_count = best[norm]
+            if para_count > prev_count:
+                keep[prev_idx] = False
+                best[norm] = (idx, para_count)
+            else:
+                keep[idx] = False
+        else:
+            best[norm] = (idx, para_count)
+
+    return [sec for sec, kept in zip(sections, keep) if kept]
 
-    # Build filtered list
-    return [sec for idx, sec in enumerate(sections) if idx not in remove_indices]
 
 def generate_outline(sections: list[Section]) -> str:
     """Generate a text outline of the thesis structure.
@@ -420,7 +583,7 @@ def generate_outline(sections: list[Section]) -> str:
     """
     lines = []
     for i, sec in enumerate(sections, 1):
-        para_count = len(sec.paragraphs)
+        para_count = sec.para_count
         lines.append(f"{i}. {sec.name} ({para_count}段)")
     return "\n".join(lines)
 
@@ -429,7 +592,7 @@ def generate_outline(sections: list[Section]) -> str:
 # Prompts for SECTION-based review (full-text, batch by chapter)
 # ---------------------------------------------------------------------------
 
-SECTION_REVIEW_SYSTEM_PROMPT = """你是一位经验丰富的本科毕业论文评审专家。你正在对论文进行逐章节深度评审，重点关注论文的学术质量和内容问题。
+_SECTION_REVIEW_SYSTEM_PROMPT_TEMPLATE = """你是一位经验丰富的本科毕业论文评审专家。你正在对论文进行逐章节深度评审，重点关注论文的学术质量和内容问题。
 
 ## 核心评审原则
 
@@ -476,11 +639,7 @@ SECTION_REVIEW_SYSTEM_PROMPT = """你是一位经验丰富的本科毕业论文
 
 ## 评审要求
 
-你当前正在评审论文的 **一个特定章节/部分**。请：
-1. 深入审查该章节中每个段落的内容质量
-2. 评审意见要具体、有建设性，指出问题并给出修改方向
-3. 关注真正影响论文学术质量的实质性问题
-4. 每个有问题的段落都应指出，但不要为了凑数而输出无意义的意见
+{review_scope}
 
 ## 输出格式
 
@@ -507,6 +666,19 @@ SECTION_REVIEW_SYSTEM_PROMPT = """你是一位经验丰富的本科毕业论文
 7. 不要输出 summary 字段，只需输出 comments 数组
 """
 
+SECTION_REVIEW_SYSTEM_PROMPT = _SECTION_REVIEW_SYSTEM_PROMPT_TEMPLATE.format(review_scope="""你当前正在评审论文的 **一个特定章节/部分**。请：
+1. 深入审查该章节中每个段落的内容质量
+2. 评审意见要具体、有建设性，指出问题并给出修改方向
+3. 关注真正影响论文学术质量的实质性问题
+4. 每个有问题的段落都应指出，但不要为了凑数而输出无意义的意见""")
+
+# Several short adjacent sections packed into one request
+MULTI_SECTION_REVIEW_SYSTEM_PROMPT = _SECTION_REVIEW_SYSTEM_PROMPT_TEMPLATE.format(review_scope="""你当前正在评审论文中 **若干个相邻的较短章节/部分**，它们被合并在同一次评审中，每个部分单独编号并附有各自的评审重点。请：
+1. 对每个部分分别进行评审，深入审查其中每个段落的内容质量，并遵循该部分的评审重点
+2. 评审意见要具体、有建设性，指出问题并给出修改方向
+3. 关注真正影响论文学术质量的实质性问题
+4. 每个有问题的段落都应指出，但不要为了凑数而输出无意义的意见""")
+
 
 SECTION_REVIEW_USER_PROMPT_TEMPLATE = """## 论文全文大纲
 
@@ -536,6 +708,39 @@ SECTION_REVIEW_USER_PROMPT_TEMPLATE = """## 论文全文大纲
 """
 
 
+MULTI_SECTION_REVIEW_USER_PROMPT_TEMPLATE = """## 论文全文大纲
+
+{outline}
+
+## 当前评审部分
+
+你正在评审第 {batch_index}/{total_batches} 批内容，本批包含以下 {section_count} 个部分，请对每个部分分别进行评审。
+
+{sections_text}
+
+请仔细审查以上每个部分中的每一个段落，逐条指出所有问题。以 JSON 格式输出评审结果：
+{{
+  "comments": [
+    {{
+      "paragraph_index": 0,
+      "target_text": "原文中的具体文本片段",
+      "comment": "评审意见",
+      "severity": "error|warning|suggestion"
+    }}
+  ]
+}}
+"""
+
+
+MULTI_SECTION_PART_TEMPLATE = """### 第 {section_index} 部分：{section_name}
+
+{review_focus}
+
+#### 待评审内容
+
+{paragraphs_text}"""
+
+
 # ---------------------------------------------------------------------------
 # Original prompts for selection review (single-request, no batching)
 # ---------------------------------------------------------------------------
@@ -652,35 +857,37 @@ THESIS_COMMENT_USER_PROMPT_TEMPLATE = """请对以下论文全文进行整体评
 
 
 def format_paragraphs_for_prompt(
-    paragraphs: list[dict],
+    texts: Iterable[str],
+    indices: Iterable[int],
 ) -> str:
     """Format paragraph data into a string for the LLM prompt.
 
     Args:
-        paragraphs: List of paragraph dicts with 'index' and 'text' keys.
+        texts: Paragraph texts.
+        indices: Original paragraph indices, parallel to ``texts``.
 
     Returns:
         Formatted string representation of paragraphs.
     """
-    lines = []
-    for p in paragraphs:
-        if p["text"].strip():
-            lines.append(f"[段落 {p['index']}] {p['text']}")
-    return "\n\n".join(lines)
+    return "\n\n".join(
+        f"[段落 {i}] {t}" for t, i in zip(texts, indices) if t.strip()
+    )
 
 
 def build_review_messages(
-    paragraphs: list[dict],
+    paragraphs: list[ParagraphData],
 ) -> list[dict]:
     """Build the chat messages for selection review (single request).
 
     Args:
-        paragraphs: List of paragraph dicts with 'index' and 'text' keys.
+        paragraphs: Paragraphs from the request.
 
     Returns:
         List of message dicts for the OpenAI API.
     """
-    paragraphs_text = format_paragraphs_for_prompt(paragraphs)
+    paragraphs_text = format_paragraphs_for_prompt(
+        (p.text for p in paragraphs), (p.index for p in paragraphs)
+    )
     user_prompt = THESIS_REVIEW_USER_PROMPT_TEMPLATE.format(
         paragraphs_text=paragraphs_text
     )
@@ -690,6 +897,12 @@ def build_review_messages(
     ]
 
 
+def _section_review_focus(section: Section) -> str:
+    """Return the review-focus block for a section's type."""
+    focus = SECTION_REVIEW_FOCUS.get(section.section_type, "")
+    return f"### 本章节评审重点\n\n{focus}" if focus else ""
+
+
 def build_section_review_messages(
     section: Section,
     outline: str,
@@ -707,38 +920,82 @@ def build_section_review_messages(
     Returns:
         List of message dicts for the OpenAI API.
     """
-    paragraphs_text = format_paragraphs_for_prompt(section.paragraphs)
-
-    # Get review focus for this section type
-    focus = SECTION_REVIEW_FOCUS.get(section.section_type, "")
-    review_focus = f"### 本章节评审重点\n\n{focus}" if focus else ""
+    key = (outline, batch_index, total_batches)
+    if key in section.cached_messages:
+        return section.cached_messages[key]
 
     user_prompt = SECTION_REVIEW_USER_PROMPT_TEMPLATE.format(
         outline=outline,
         batch_index=batch_index,
         total_batches=total_batches,
         section_name=section.name,
-        review_focus=review_focus,
-        paragraphs_text=paragraphs_text,
+        review_focus=_section_review_focus(section),
+        paragraphs_text=section.formatted_text,
     )
-    return [
+    messages = [
         {"role": "system", "content": SECTION_REVIEW_SYSTEM_PROMPT},
         {"role": "user", "content": user_prompt},
     ]
+    section.cached_messages[key] = messages
+    return messages
+
+
+def build_multi_section_review_messages(
+    sections: list[Section],
+    outline: str,
+    batch_index: int,
+    total_batches: int,
+) -> list[dict]:
+    """Build the chat messages for reviewing several small sections at once.
+
+    Each section keeps its own review focus in a numbered block.
+    Paragraph indices are global, so comments need no section tag.
+
+    Args:
+        sections: The sections packed into this request.
+        outline: Full thesis outline string.
+        batch_index: 1-based index of the current batch.
+        total_batches: Total number of batches.
+
+    Returns:
+        List of message dicts for the OpenAI API.
+    """
+    sections_text = "\n\n---\n\n".join(
+        MULTI_SECTION_PART_TEMPLATE.format(
+            section_index=i,
+            section_name=section.name,
+            review_focus=_section_review_focus(section),
+            paragraphs_text=section.formatted_text,
+        )
+        for i, section in enumerate(sections, 1)
+    )
+    user_prompt = MULTI_SECTION_REVIEW_USER_PROMPT_TEMPLATE.format(
+        outline=outline,
+        batch_index=batch_index,
+        total_batches=total_batches,
+        section_count=len(sections),
+        sections_text=sections_text,
+    )
+    return [
+        {"role": "system", "content": MULTI_SECTION_REVIEW_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
 
 
 def build_comment_messages(
-    paragraphs: list[dict],
+    paragraphs: list[ParagraphData],
 ) -> list[dict]:
     """Build the chat messages for the overall comment generation.
 
     Args:
-        paragraphs: List of paragraph dicts with 'index' and 'text' keys.
+        paragraphs: Paragraphs from the request.
 
     Returns:
         List of message dicts for the OpenAI API.
     """
-    paragraphs_text = format_paragraphs_for_prompt(paragraphs)
+    paragraphs_text = format_paragraphs_for_prompt(
+        (p.text for p in paragraphs), (p.index for p in paragraphs)
+    )
     user_prompt = THESIS_COMMENT_USER_PROMPT_TEMPLATE.format(
         paragraphs_text=paragraphs_text
     )
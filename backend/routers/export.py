@@ -1,6 +1,8 @@
 """Export API router for generating review reports."""
 
 import logging
+from collections.abc import Iterator
+from typing import IO
 
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
@@ -12,6 +14,24 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["export"])
 
+# Size of the body chunks a generated document is sent in
+_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_buffer(buffer: IO[bytes]) -> Iterator[bytes]:
+    """Yield a document buffer in fixed-size chunks, then close it.
+
+    Iterating the buffer directly would split the zip data at every
+    newline byte, sending the document in many small chunks. The buffer
+    is closed even if the client disconnects mid-download, which also
+    removes any temporary file backing it.
+    """
+    try:
+        while chunk := buffer.read(_CHUNK_SIZE):
+            yield chunk
+    finally:
+        buffer.close()
+
 
 @router.post("/export/docx")
 async def export_docx(request: ExportRequest):
@@ -25,7 +45,7 @@ async def export_docx(request: ExportRequest):
     filename = f"{request.document_title}_review_report.docx"
 
     return StreamingResponse(
-        buffer,
+        _iter_buffer(buffer),
         media_type=(
             "application/vnd.openxmlformats-officedocument"
             ".wordprocessingml.document"
@@ -47,7 +67,7 @@ async def export_comment_docx(request: OverallCommentExportRequest):
     filename = f"{request.document_title}_overall_comment.docx"
 
     return StreamingResponse(
-        buffer,
+        _iter_buffer(buffer),
         media_type=(
             "application/vnd.openxmlformats-officedocument"
             ".wordprocessingml.document"
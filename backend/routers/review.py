@@ -56,9 +56,14 @@ async def review_stream(request: ReviewRequest):
         - done: {}
     """
 
+    # Split paragraphs into parallel text/index lists for section detection
+    texts = [p.text for p in request.paragraphs]
+    indices = [p.index for p in request.paragraphs]
+
     async def event_generator():
         async for event in llm_service.review_paragraphs_stream(
-            paragraphs=request.paragraphs,
+            texts=texts,
+            indices=indices,
             api_key=request.api_key,
             base_url=request.base_url,
             model_name=request.model_name,
@@ -1,8 +1,14 @@
 """Export service for generating review report documents."""
 
+import copy
 import io
 import logging
 import re
+import tempfile
+from collections import defaultdict
+from functools import lru_cache
+from typing import IO
+from xml.sax.saxutils import escape
 
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -18,20 +24,36 @@ logger = logging.getLogger(__name__)
 CN_FONT = "黑体"
 EN_FONT = "Times New Roman"
 
+# Qualified rFonts attribute names, set on every run
+_QN_ASCII = qn("w:ascii")
+_QN_HANSI = qn("w:hAnsi")
+_QN_EAST_ASIA = qn("w:eastAsia")
+
+# Generated documents stay in memory up to this size, then spill to disk
+_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Markdown **bold** markers, capturing the bold segment
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
+# Paragraph borders, parsed once and deep-copied into each paragraph
+_HEADING_BOTTOM_BDR = parse_xml(
+    f'<w:pBdr {nsdecls("w")}>'
+    '  <w:bottom w:val="single" w:sz="6" w:space="4" w:color="CCCCCC"/>'
+    '</w:pBdr>'
+)
+# Horizontal rule borders keyed by color
+_HR_BDRS = {}
+
 
 def _set_run_font(run, font_name_cn=CN_FONT, font_name_en=EN_FONT, size=None, bold=False, color=None, italic=False):
     """Helper to set font properties on a run consistently."""
-    run.font.name = font_name_en
-    # Ensure rPr and rFonts elements exist
+    # Set all three font slots on rFonts directly; creating the element
+    # through the oxml API avoids both parse_xml and the font.name proxy
     rPr = run._element.get_or_add_rPr()
-    rFonts = rPr.find(qn("w:rFonts"))
-    if rFonts is None:
-        rFonts = parse_xml(f'<w:rFonts {nsdecls("w")} w:ascii="{font_name_en}" w:hAnsi="{font_name_en}" w:eastAsia="{font_name_cn}"/>')
-        rPr.insert(0, rFonts)
-    else:
-        rFonts.set(qn("w:eastAsia"), font_name_cn)
-        rFonts.set(qn("w:ascii"), font_name_en)
-        rFonts.set(qn("w:hAnsi"), font_name_en)
+    rFonts = rPr.get_or_add_rFonts()
+    rFonts.set(_QN_ASCII, font_name_en)
+    rFonts.set(_QN_HANSI, font_name_en)
+    rFonts.set(_QN_EAST_ASIA, font_name_cn)
     if size:
         run.font.size = size
     run.bold = bold
@@ -94,12 +116,7 @@ def _add_styled_heading(doc, text, level=1, color=None):
         )
         # Add a bottom border to the paragraph for visual structure
         pPr = para._element.get_or_add_pPr()
-        pBdr = parse_xml(
-            f'<w:pBdr {nsdecls("w")}>'
-            '  <w:bottom w:val="single" w:sz="6" w:space="4" w:color="CCCCCC"/>'
-            '</w:pBdr>'
-        )
-        pPr.append(pBdr)
+        pPr.append(copy.deepcopy(_HEADING_BOTTOM_BDR))
         run = para.add_run(text)
         _set_run_font(run, size=Pt(16), bold=True, color=color or RGBColor(0x1A, 0x1A, 0x2E))
 
@@ -122,12 +139,14 @@ def _add_horizontal_rule(doc, color="BBBBBB"):
     para = doc.add_paragraph()
     _set_paragraph_format(para, space_before=Pt(4), space_after=Pt(4))
     pPr = para._element.get_or_add_pPr()
-    pBdr = parse_xml(
-        f'<w:pBdr {nsdecls("w")}>'
-        f'  <w:bottom w:val="single" w:sz="4" w:space="1" w:color="{color}"/>'
-        '</w:pBdr>'
-    )
-    pPr.append(pBdr)
+    pBdr = _HR_BDRS.get(color)
+    if pBdr is None:
+        pBdr = _HR_BDRS[color] = parse_xml(
+            f'<w:pBdr {nsdecls("w")}>'
+            f'  <w:bottom w:val="single" w:sz="4" w:space="1" w:color="{color}"/>'
+            '</w:pBdr>'
+        )
+    pPr.append(copy.deepcopy(pBdr))
     return para
 
 
@@ -143,8 +162,8 @@ def _add_body_text(doc, text, size=Pt(11), color=None, bold=False, italic=False,
         left_indent=left_indent,
         first_line_indent=first_line_indent,
     )
-    run = para.add_run(text)
-    _set_run_font(run, size=size, bold=bold, color=color, italic=italic)
+    _add_run_styled(para, text, int(size.pt * 2), bold=bold, italic=italic,
+                    color=str(color) if color else None)
     return para
 
 
@@ -165,18 +184,121 @@ def _add_markdown_paragraph(doc, text, font_size=Pt(12), line_spacing=1.8, space
     )
 
     # Split by **...**  pattern, capturing the bold segments
-    parts = re.split(r"\*\*(.+?)\*\*", text)
+    parts = _BOLD_RE.split(text)
+    half_points = int(font_size.pt * 2)
+    hex_color = str(color) if color else None
 
     for i, part in enumerate(parts):
         if not part:
             continue
         is_bold = (i % 2 == 1)  # odd indices are inside ** **
-        run = para.add_run(part)
-        _set_run_font(run, size=font_size, bold=is_bold, color=color)
+        _add_run_styled(para, part, half_points, bold=is_bold, color=hex_color)
 
     return para
 
 
+# ---------- Raw WordprocessingML for comment blocks ----------
+# Comment blocks make up most of a review report, so their paragraphs are
+# written as XML directly and parsed once per comment instead of being
+# assembled run by run through python-docx. The markup matches what
+# python-docx and _set_run_font produce, except that the quote border
+# is placed where the schema expects it (before spacing and indent).
+# Body text runs are built from the same markup via _add_run_styled.
+
+_RFONTS_XML = f'<w:rFonts w:ascii="{EN_FONT}" w:hAnsi="{EN_FONT}" w:eastAsia="{CN_FONT}"/>'
+_RUN_BREAK_RE = re.compile(r"([\t\r\n])")
+
+# Paragraph properties; spacing and indents are in twips (Pt(4) = 80,
+# Cm(1) = 567) and line spacing in 240ths of a line (1.5 = 360)
+_COMMENT_NUMBER_PPR = '<w:pPr><w:spacing w:after="80" w:line="336" w:lineRule="auto"/></w:pPr>'
+_COMMENT_QUOTE_PPR = (
+    '<w:pPr>'
+    '<w:pBdr><w:left w:val="single" w:sz="12" w:space="8" w:color="CCCCCC"/></w:pBdr>'
+    '<w:spacing w:after="80" w:line="360" w:lineRule="auto"/><w:ind w:left="567"/>'
+    '</w:pPr>'
+)
+_COMMENT_BODY_PPR = '<w:pPr><w:spacing w:after="80" w:line="360" w:lineRule="auto"/><w:ind w:left="567"/></w:pPr>'
+_COMMENT_LOCATION_PPR = '<w:pPr><w:spacing w:after="320" w:line="312" w:lineRule="auto"/><w:ind w:left="567"/></w:pPr>'
+
+
+def _run_xml(text, half_points, bold=False, italic=False, color=None):
+    """Build a run with the report fonts, like add_run + _set_run_font.
+
+    Tabs and line breaks become <w:tab/> and <w:br/> as python-docx does.
+    Size is in half-points and color an RRGGBB hex string.
+    """
+    parts = ["<w:r><w:rPr>", _RFONTS_XML]
+    parts.append("<w:b/>" if bold else '<w:b w:val="0"/>')
+    parts.append("<w:i/>" if italic else '<w:i w:val="0"/>')
+    if color:
+        parts.append(f'<w:color w:val="{color}"/>')
+    parts.append(f'<w:sz w:val="{half_points}"/></w:rPr>')
+    for piece in _RUN_BREAK_RE.split(text):
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\r", "\n"):
+            parts.append("<w:br/>")
+        elif piece:
+            space = ' xml:space="preserve"' if piece != piece.strip() else ""
+            parts.append(f"<w:t{space}>{escape(piece)}</w:t>")
+    parts.append("</w:r>")
+    return "".join(parts)
+
+
+def _add_run_styled(para, text, half_points, bold=False, italic=False, color=None):
+    """Append a run with the report fonts to a paragraph.
+
+    Equivalent to para.add_run(text) followed by _set_run_font, but the
+    run is parsed from _run_xml markup in one step.
+
+    Args:
+        para: Paragraph to append the run to.
+        text: Run text.
+        half_points: Font size in half-points.
+        bold: Whether the run is bold.
+        italic: Whether the run is italic.
+        color: RRGGBB hex string, or None for the default color.
+
+    Returns:
+        The appended run element.
+    """
+    # _run_xml has no namespace declarations, so parse it inside a wrapper
+    wrapper = parse_xml(f'<w:p {nsdecls("w")}>{_run_xml(text, half_points, bold, italic, color)}</w:p>')
+    r = wrapper[0]
+    para._p.append(r)
+    return r
+
+
+def _build_comment_xml(comment, idx):
+    """Build the paragraphs of one review comment as WordprocessingML.
+
+    Args:
+        comment: The review comment.
+        idx: 1-based number of the comment within its severity group.
+
+    Returns:
+        The comment's paragraphs wrapped in a single <w:body> element.
+    """
+    quote = f'"{comment.target_text}"'
+    location = f"位置: 第 {comment.paragraph_index + 1} 段"
+    return "".join((
+        f'<w:body {nsdecls("w")}>',
+        # Comment number sub-heading
+        "<w:p>", _COMMENT_NUMBER_PPR, _run_xml(f"意见 {idx}", 24, bold=True), "</w:p>",
+        # Target text (quoted) - indented block with left border
+        "<w:p>", _COMMENT_QUOTE_PPR,
+        _run_xml("原文: ", 21, bold=True, color="555555"),
+        _run_xml(quote, 21, italic=True, color="555555"), "</w:p>",
+        # Comment content
+        "<w:p>", _COMMENT_BODY_PPR,
+        _run_xml("意见: ", 22, bold=True),
+        _run_xml(comment.comment, 22), "</w:p>",
+        # Paragraph index
+        "<w:p>", _COMMENT_LOCATION_PPR, _run_xml(location, 18, color="999999"), "</w:p>",
+        "</w:body>",
+    ))
+
+
 # Severity display config
 SEVERITY_CONFIG = {
     "error": {"label": "严重问题 (必须修改)", "color": RGBColor(0xC6, 0x28, 0x28)},
@@ -191,23 +313,53 @@ def _set_default_document_font(doc):
     font = style.font
     font.name = EN_FONT
     font.size = Pt(11)
-    style._element.rPr.rFonts.set(qn("w:eastAsia"), CN_FONT)
+    style._element.rPr.rFonts.set(_QN_EAST_ASIA, CN_FONT)
+
+
+def _save_document(doc) -> IO[bytes]:
+    """Save a document to a spooled temporary file, rewound for reading."""
+    buffer = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+@lru_cache(maxsize=None)
+def _template_bytes(side_margin_cm: float) -> bytes:
+    """Build the blank report document once per side margin.
+
+    Margins and the default font are applied here and the result is
+    kept as .docx bytes, so each export only loads the prepared package.
+
+    Args:
+        side_margin_cm: Left and right page margin in centimeters.
+
+    Returns:
+        The prepared empty document, serialized as .docx.
+    """
+    doc = Document()
+    for section in doc.sections:
+        section.top_margin = Cm(2.5)
+        section.bottom_margin = Cm(2.5)
+        section.left_margin = Cm(side_margin_cm)
+        section.right_margin = Cm(side_margin_cm)
+    _set_default_document_font(doc)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
 
-    # Also ensure heading styles use our font
-    for heading_level in range(1, 5):
-        style_name = f"Heading {heading_level}"
-        if style_name in doc.styles:
-            h_style = doc.styles[style_name]
-            h_font = h_style.font
-            h_font.name = EN_FONT
-            h_style._element.rPr.rFonts.set(qn("w:eastAsia"), CN_FONT)
+def _new_document(side_margin_cm: float):
+    """Create a report document with page margins and default font set."""
+    return Document(io.BytesIO(_template_bytes(side_margin_cm)))
 
 
 def generate_review_report(
     comments: list[ReviewComment],
     summary: str,
     document_title: str,
-) -> io.BytesIO:
+) -> IO[bytes]:
     """Generate a Word document (.docx) containing the review report.
 
     Args:
@@ -216,19 +368,11 @@ def generate_review_report(
         document_title: Title of the original document.
 
     Returns:
-        BytesIO buffer containing the .docx file.
+        Spooled temporary file containing the .docx file, positioned at
+        the start. The caller is responsible for closing it.
     """
-    doc = Document()
-
-    # -- Page margins --
-    for section in doc.sections:
-        section.top_margin = Cm(2.5)
-        section.bottom_margin = Cm(2.5)
-        section.left_margin = Cm(2.8)
-        section.right_margin = Cm(2.8)
-
-    # -- Set document default font --
-    _set_default_document_font(doc)
+    # -- Page margins and document default font --
+    doc = _new_document(side_margin_cm=2.8)
 
     # -- Title --
     _add_styled_heading(doc, "论文评审报告", level=0)
@@ -247,15 +391,16 @@ def generate_review_report(
     )
 
     # -- Statistics --
-    error_count = sum(1 for c in comments if c.severity == "error")
-    warning_count = sum(1 for c in comments if c.severity == "warning")
-    suggestion_count = sum(1 for c in comments if c.severity == "suggestion")
+    # Group comments by severity in one pass; the counts come from the groups
+    grouped: defaultdict[str, list[ReviewComment]] = defaultdict(list)
+    for c in comments:
+        grouped[c.severity].append(c)
 
     stats_text = (
         f"共 {len(comments)} 条评审意见: "
-        f"{error_count} 个严重问题, "
-        f"{warning_count} 个一般问题, "
-        f"{suggestion_count} 个改进建议"
+        f"{len(grouped['error'])} 个严重问题, "
+        f"{len(grouped['warning'])} 个一般问题, "
+        f"{len(grouped['suggestion'])} 个改进建议"
     )
     _add_body_text(
         doc,
@@ -270,10 +415,7 @@ def generate_review_report(
     _add_styled_heading(doc, "总体评审摘要", level=1)
 
     if summary:
-        for para_text in summary.split("\n"):
-            stripped = para_text.strip()
-            if not stripped:
-                continue
+        for stripped in filter(None, (line.strip() for line in summary.splitlines())):
             _add_markdown_paragraph(
                 doc,
                 stripped,
@@ -284,10 +426,11 @@ def generate_review_report(
             )
 
     # -- Comments grouped by severity --
+    body = doc.element.body
     severity_order = ["error", "warning", "suggestion"]
 
     for severity in severity_order:
-        severity_comments = [c for c in comments if c.severity == severity]
+        severity_comments = grouped[severity]
         if not severity_comments:
             continue
 
@@ -295,75 +438,17 @@ def generate_review_report(
         _add_styled_heading(doc, config["label"], level=1, color=config["color"])
 
         for idx, comment in enumerate(severity_comments, 1):
-            # Comment number sub-heading
-            _add_body_text(
-                doc,
-                f"意见 {idx}",
-                size=Pt(12),
-                bold=True,
-                space_after=Pt(4),
-                line_spacing=1.4,
-            )
+            # Number, quoted target text, comment and location paragraphs
+            for p in list(parse_xml(_build_comment_xml(comment, idx))):
+                body._insert_p(p)
 
-            # Target text (quoted) - indented block with left border effect
-            quote_para = doc.add_paragraph()
-            _set_paragraph_format(
-                quote_para,
-                left_indent=Cm(1),
-                space_after=Pt(4),
-                line_spacing=1.5,
-            )
-            # Add a left border for quote-style appearance
-            pPr = quote_para._element.get_or_add_pPr()
-            pBdr = parse_xml(
-                f'<w:pBdr {nsdecls("w")}>'
-                '  <w:left w:val="single" w:sz="12" w:space="8" w:color="CCCCCC"/>'
-                '</w:pBdr>'
-            )
-            pPr.append(pBdr)
-
-            label_run = quote_para.add_run("原文: ")
-            _set_run_font(label_run, size=Pt(10.5), bold=True, color=RGBColor(0x55, 0x55, 0x55))
-
-            text_run = quote_para.add_run(f'"{comment.target_text}"')
-            _set_run_font(text_run, size=Pt(10.5), color=RGBColor(0x55, 0x55, 0x55), italic=True)
-
-            # Comment content
-            comment_para = doc.add_paragraph()
-            _set_paragraph_format(
-                comment_para,
-                left_indent=Cm(1),
-                space_after=Pt(4),
-                line_spacing=1.5,
-            )
-            cl_run = comment_para.add_run("意见: ")
-            _set_run_font(cl_run, size=Pt(11), bold=True)
-
-            cc_run = comment_para.add_run(comment.comment)
-            _set_run_font(cc_run, size=Pt(11))
-
-            # Paragraph index
-            _add_body_text(
-                doc,
-                f"位置: 第 {comment.paragraph_index + 1} 段",
-                size=Pt(9),
-                color=RGBColor(0x99, 0x99, 0x99),
-                left_indent=Cm(1),
-                space_after=Pt(16),
-                line_spacing=1.3,
-            )
-
-    # Save to buffer
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+    return _save_document(doc)
 
 
 def generate_comment_report(
     comment_text: str,
     document_title: str,
-) -> io.BytesIO:
+) -> IO[bytes]:
     """Generate a beautifully formatted Word document (.docx) for overall comment.
 
     Uses manual font styling (no default Word heading styles) with consistent
@@ -374,19 +459,11 @@ def generate_comment_report(
         document_title: Title of the original document.
 
     Returns:
-        BytesIO buffer containing the .docx file.
+        Spooled temporary file containing the .docx file, positioned at
+        the start. The caller is responsible for closing it.
     """
-    doc = Document()
-
-    # Set default document margins
-    for section in doc.sections:
-        section.top_margin = Cm(2.5)
-        section.bottom_margin = Cm(2.5)
-        section.left_margin = Cm(3)
-        section.right_margin = Cm(3)
-
-    # Set default font
-    _set_default_document_font(doc)
+    # Set default document margins and font
+    doc = _new_document(side_margin_cm=3)
 
     # -- Main Title --
     title_para = doc.add_paragraph()
@@ -419,10 +496,7 @@ def generate_comment_report(
     _set_paragraph_format(spacer, space_after=Pt(8))
 
     # -- Comment body --
-    for paragraph_text in comment_text.split("\n"):
-        stripped = paragraph_text.strip()
-        if not stripped:
-            continue
+    for stripped in filter(None, (line.strip() for line in comment_text.splitlines())):
         _add_markdown_paragraph(
             doc,
             stripped,
@@ -432,8 +506,4 @@ def generate_comment_report(
             first_line_indent=Pt(24),
         )
 
-    # Save to buffer
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+    return _save_document(doc)
@@ -1,22 +1,98 @@
 """LLM service for thesis review using OpenAI SDK."""
 
+import asyncio
 import json
 import logging
+import os
+import re
+from collections import OrderedDict
 from collections.abc import AsyncGenerator
 
+import orjson
 from openai import AsyncOpenAI
+from pydantic import ValidationError
 
 from models.schemas import ParagraphData, ReviewComment, ReviewResponse
 from prompts.thesis_review import (
     build_review_messages,
+    build_multi_section_review_messages,
     build_section_review_messages,
     build_comment_messages,
+    Section,
     detect_sections,
     generate_outline,
+    paragraphs_digest,
 )
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of section reviews in flight against the LLM provider.
+# At least one worker is needed, or the review stream waits forever
+MAX_CONCURRENCY = max(1, int(os.environ.get("THESISCHECK_MAX_CONCURRENCY", "4")))
+
+# Sections estimated below SMALL_SECTION_TOKENS are packed together with
+# their small neighbours, up to PACK_MAX_TOKENS per request
+SMALL_SECTION_TOKENS = 1500
+PACK_MAX_TOKENS = 8000
+
+# SSE events of successfully reviewed batches, keyed by (doc_hash, first
+# and last paragraph index, base_url, model_name). A client retrying a
+# dropped stream gets finished batches replayed instead of re-reviewed.
+_BATCH_EVENTS_CACHE_SIZE = 256
+_batch_events_cache: OrderedDict[tuple, list[dict]] = OrderedDict()
+
+# OpenAI clients keyed by (api_key, base_url). Each client owns an HTTP
+# connection pool, so reusing it saves connection and TLS setup on every
+# request after the first.
+_CLIENT_CACHE_SIZE = 32
+_clients: OrderedDict[tuple[str, str], AsyncOpenAI] = OrderedDict()
+
+# Characters the streaming comment parser acts on: escape sequences
+# (consumed whole, or a lone backslash at the end of a chunk), quotes and
+# brackets. Everything else is skipped without a Python-level loop.
+_JSON_TOKEN_RE = re.compile(r'\\.|[\\"\[\]{}]', re.DOTALL)
+
+
+def _get_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    """Return the cached OpenAI client for the given credentials.
+
+    Args:
+        api_key: User's API key.
+        base_url: Base URL for the API.
+
+    Returns:
+        AsyncOpenAI client, created on first use.
+    """
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is not None:
+        _clients.move_to_end(key)
+        return client
+
+    client = _clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    if len(_clients) > _CLIENT_CACHE_SIZE:
+        # An evicted client may still be streaming; it closes its
+        # connections once it is garbage collected
+        _clients.popitem(last=False)
+    return client
+
+
+async def close_clients() -> None:
+    """Close all cached OpenAI clients, e.g. on application shutdown."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
+
+
+def _text_event_data(content: str) -> str:
+    """Encode the data of a "text" SSE event: {"content": content}.
+
+    Only the string needs JSON escaping, so the wrapper is concatenated
+    rather than serialized as a dict for every streamed token.
+    """
+    return '{"content":' + orjson.dumps(content).decode() + "}"
+
 
 def extract_comments_from_json(
     json_str: str,
@@ -30,7 +106,7 @@ def extract_comments_from_json(
         List of ReviewComment objects.
     """
     try:
-        data = json.loads(json_str)
+        data = orjson.loads(json_str)
         comments = []
         raw_comments = data.get("comments", [])
         for c in raw_comments:
@@ -47,11 +123,22 @@ def extract_comments_from_json(
                 logger.warning("Skipping malformed comment: %s", c)
                 continue
         return comments
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error("Failed to parse LLM JSON response: %s", e)
         return []
 
 
+class _StreamedComment(ReviewComment):
+    """ReviewComment as parsed from a streamed JSON object.
+
+    The model may omit the paragraph index and severity; target_text and
+    comment are required, so incomplete fragments fail validation.
+    """
+
+    paragraph_index: int = 0
+    severity: str = "suggestion"
+
+
 def try_extract_single_comment(json_str: str) -> ReviewComment | None:
     """Try to parse a single comment object from a JSON string fragment.
 
@@ -61,18 +148,16 @@ def try_extract_single_comment(json_str: str) -> ReviewComment | None:
     Returns:
         ReviewComment if valid, None otherwise.
     """
+    # Both keys are required, so fragments without them cannot validate;
+    # reject those before paying for a parse and a raised exception
+    if '"target_text"' not in json_str or '"comment"' not in json_str:
+        return None
+    # orjson + model_validate beats model_validate_json on the mostly
+    # non-ASCII text the model returns
     try:
-        c = json.loads(json_str)
-        if isinstance(c, dict) and "target_text" in c and "comment" in c:
-            return ReviewComment(
-                paragraph_index=c.get("paragraph_index", 0),
-                target_text=c.get("target_text", ""),
-                comment=c.get("comment", ""),
-                severity=c.get("severity", "suggestion"),
-            )
-    except (json.JSONDecodeError, Exception):
-        pass
-    return None
+        return _StreamedComment.model_validate(orjson.loads(json_str))
+    except (orjson.JSONDecodeError, ValidationError):
+        return None
 
 
 async def check_api_health(
@@ -91,7 +176,7 @@ async def check_api_health(
         Tuple of (success: bool, message: str).
     """
     try:
-        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        client = _get_client(api_key, base_url)
         response = await client.chat.completions.create(
             model=model_name,
             messages=[{"role": "user", "content": "test"}],
@@ -125,10 +210,9 @@ async def review_paragraphs(
     Returns:
         ReviewResponse with all comments.
     """
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    client = _get_client(api_key, base_url)
 
-    para_dicts = [{"index": p.index, "text": p.text} for p in paragraphs]
-    messages = build_review_messages(para_dicts)
+    messages = build_review_messages(paragraphs)
 
     try:
         response = await client.chat.completions.create(
@@ -171,59 +255,247 @@ async def _stream_single_batch(
         extra_body={"thinking": {"type": "disabled"}}
     )
 
-    buffer = ""
+    # The response is kept as a list of chunks and joined only for the
+    # final fallback parse; the comment object being scanned is
+    # collected separately in `active`
+    chunks: list[str] = []
+    active: list[str] = []
     in_comments_array = False
+    # Whether '"comments"' has been seen, and the end of the previous
+    # chunks, where an occurrence split across chunks would begin
+    comments_key_found = False
+    key_tail = ""
+    # JSON string state, so brackets inside string values are ignored
+    in_string = False
+    escaped = False
     brace_depth = 0
-    current_object_start = -1
     emitted_count = 0
 
     async for chunk in response:
         delta = chunk.choices[0].delta
-        if delta.content:
-            buffer += delta.content
+        content = delta.content
+        if content:
+            chunks.append(content)
 
             # Yield raw text chunk
-            yield ("text", delta.content)
-
-            # Incremental parsing for comment objects
-            i = len(buffer) - len(delta.content)
-            if i < 0:
-                i = 0
-
-            while i < len(buffer):
-                char = buffer[i]
-
-                if not in_comments_array:
-                    if char == "[" and '"comments"' in buffer[:i]:
-                        in_comments_array = True
+            yield ("text", content)
+
+            # Incremental parsing for comment objects. `obj_start` is
+            # where the open object starts in this chunk (0 if it began
+            # in an earlier one)
+            obj_start = 0
+            # Skip the character escaped by a backslash ending the
+            # previous chunk
+            scan_from = 1 if escaped else 0
+            escaped = False
+            for match in _JSON_TOKEN_RE.finditer(content, scan_from):
+                char = match.group()
+                if in_string:
+                    if char == '"':
+                        in_string = False
+                    elif char == "\\":
+                        escaped = True
+                    continue
+                i = match.start()
+                if char == '"':
+                    in_string = True
+                elif not in_comments_array:
+                    if char == "[":
+                        if not comments_key_found:
+                            comments_key_found = (
+                                '"comments"' in key_tail + content[:i]
+                            )
+                        if comments_key_found:
+                            in_comments_array = True
                 else:
                     if char == "{":
                         if brace_depth == 0:
-                            current_object_start = i
+                            obj_start = i
                         brace_depth += 1
                     elif char == "}":
                         brace_depth -= 1
-                        if brace_depth == 0 and current_object_start >= 0:
-                            obj_str = buffer[current_object_start : i + 1]
+                        if brace_depth == 0:
+                            active.append(content[obj_start : i + 1])
+                            obj_str = "".join(active)
+                            active.clear()
                             comment = try_extract_single_comment(obj_str)
                             if comment:
                                 emitted_count += 1
                                 yield ("comment", comment)
-                            current_object_start = -1
                     elif char == "]":
                         in_comments_array = False
 
-                i += 1
+            if brace_depth > 0:
+                active.append(content[obj_start:])
+            if not comments_key_found:
+                window = key_tail + content
+                comments_key_found = '"comments"' in window
+                key_tail = window[-len('"comments"') + 1 :]
 
     # If no comments were emitted during streaming, try full parse
     if emitted_count == 0:
-        comments = extract_comments_from_json(buffer)
+        comments = extract_comments_from_json("".join(chunks))
         for comment in comments:
             yield ("comment", comment)
 
 
+def _estimate_tokens(section: Section) -> int:
+    """Roughly estimate the prompt tokens of a section (Chinese text)."""
+    return sum(map(len, section.texts)) // 2
+
+
+def _pack_sections(
+    sections: list[Section],
+    max_tokens: int = PACK_MAX_TOKENS,
+    small_tokens: int = SMALL_SECTION_TOKENS,
+) -> list[list[Section]]:
+    """Greedily pack adjacent small sections into shared review batches.
+
+    Short sections (abstract, acknowledgements, appendix, ...) would
+    otherwise each pay a full request with the whole system prompt. Large
+    sections are always reviewed on their own.
+
+    Args:
+        sections: Sections to review, in document order.
+        max_tokens: Estimated token budget of a packed batch.
+        small_tokens: Sections below this estimate may be packed.
+
+    Returns:
+        List of batches, each a list of one or more sections.
+    """
+    batches: list[list[Section]] = []
+    batch_tokens = 0
+    batch_packable = False  # whether the last batch holds only small sections
+    for section in sections:
+        tokens = _estimate_tokens(section)
+        is_small = tokens < small_tokens
+        if batch_packable and is_small and batch_tokens + tokens <= max_tokens:
+            batches[-1].append(section)
+            batch_tokens += tokens
+        else:
+            batches.append([section])
+            batch_tokens = tokens
+            batch_packable = is_small
+    return batches
+
+
+def _flush_text_event(events: list[dict], pending_text: list[str]) -> None:
+    """Append the collected text chunks to ``events`` as one text event.
+
+    Args:
+        events: Cached SSE events of a batch.
+        pending_text: Text chunks received since the last other event;
+            cleared afterwards.
+    """
+    if pending_text:
+        events.append(
+            {
+                "event": "text",
+                "data": _text_event_data("".join(pending_text)),
+            }
+        )
+        pending_text.clear()
+
+
+async def _review_batch(
+    client: AsyncOpenAI,
+    model_name: str,
+    batch_label: str,
+    batch_name: str,
+    messages: list[dict],
+    queue: asyncio.Queue,
+    cache_key: tuple,
+) -> None:
+    """Review one batch of sections, pushing its SSE events into a queue.
+
+    A None sentinel is pushed once the batch is finished, whether it
+    succeeded or failed. The events of a successful review are also
+    stored in the batch events cache under ``cache_key``, with each run
+    of consecutive text events merged into one.
+
+    Args:
+        client: OpenAI async client.
+        model_name: Model name.
+        batch_label: Progress label used for logging.
+        batch_name: Section name(s) used in error messages.
+        messages: Chat messages for this batch.
+        queue: Queue receiving the batch's SSE event dicts.
+        cache_key: Batch events cache key of this batch.
+    """
+    # Events kept for the cache; text chunks are collected in
+    # `pending_text` and stored as a single event per run, since a
+    # per-token copy of the response costs far more than the text
+    events: list[dict] = []
+    pending_text: list[str] = []
+    try:
+        logger.info("Reviewing section %s", batch_label)
+        async for event_type, data in _stream_single_batch(
+            client, model_name, messages
+        ):
+            if event_type == "text":
+                event = {
+                    "event": "text",
+                    "data": _text_event_data(data),
+                }
+                pending_text.append(data)
+                queue.put_nowait(event)
+                continue
+            if event_type == "comment":
+                # Call the core serializer directly, skipping the
+                # argument handling of model_dump_json
+                event = {
+                    "event": "comment",
+                    "data": data.__pydantic_serializer__.to_json(data).decode(),
+                }
+            else:
+                continue
+            _flush_text_event(events, pending_text)
+            events.append(event)
+            queue.put_nowait(event)
+
+        _flush_text_event(events, pending_text)
+        _batch_events_cache[cache_key] = events
+        if len(_batch_events_cache) > _BATCH_EVENTS_CACHE_SIZE:
+            _batch_events_cache.popitem(last=False)
+
+    except Exception as e:
+        logger.error(
+            "LLM streaming review failed for section '%s': %s",
+            batch_name,
+            e,
+        )
+        queue.put_nowait(
+            {
+                "event": "error",
+                "data": json.dumps(
+                    {"message": f"评审 {batch_name} 出错: {str(e)}"}
+                ),
+            }
+        )
+    finally:
+        queue.put_nowait(None)
+
+
+def _digest_and_detect_sections(
+    texts: list[str],
+    indices: list[int],
+) -> tuple[bytes, list[Section]]:
+    """Hash the paragraphs and detect their sections in one call.
+
+    Args:
+        texts: Paragraph texts in document order.
+        indices: Original paragraph indices, parallel to ``texts``.
+
+    Returns:
+        Tuple of (paragraphs_digest, detected sections).
+    """
+    digest = paragraphs_digest(texts, indices)
+    return digest, detect_sections(texts, indices, digest)
+
+
 async def review_paragraphs_stream(
-    paragraphs: list[ParagraphData],
+    texts: list[str],
+    indices: list[int],
     api_key: str,
     base_url: str,
     model_name: str,
@@ -231,11 +503,15 @@ async def review_paragraphs_stream(
     """Review paragraphs with chapter-based batching and streaming.
 
     Detects thesis structure (chapters/sections), then reviews each
-    section independently with context-rich prompts. Each batch streams
-    comments incrementally via SSE events.
+    section independently with context-rich prompts. Up to
+    MAX_CONCURRENCY sections are reviewed in parallel; their events are
+    buffered per section and streamed in section order, so each batch
+    still streams comments incrementally via SSE events. Batches already
+    reviewed for the same document and model are replayed from cache.
 
     Args:
-        paragraphs: List of paragraphs to review.
+        texts: Paragraph texts in document order.
+        indices: Original paragraph indices, parallel to ``texts``.
         api_key: User's API key.
         base_url: Base URL for the API.
         model_name: Model name to use.
@@ -243,26 +519,33 @@ async def review_paragraphs_stream(
     Yields:
         Dict with 'event' and 'data' keys for SSE.
     """
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-
-    para_dicts = [{"index": p.index, "text": p.text} for p in paragraphs]
-
-    # Step 1: Detect sections and create batches
-    all_sections = detect_sections(para_dicts)
+    client = _get_client(api_key, base_url)
+
+    # Step 1: Detect sections and create batches. Hashing and detection
+    # are CPU-bound, so run them in a worker thread to keep other streams
+    # served by this event loop flowing meanwhile. The content hash keys
+    # the section and reviewed-batch caches, so a retried stream reuses
+    # the work of the dropped one.
+    doc_hash, all_sections = await asyncio.to_thread(
+        _digest_and_detect_sections, texts, indices
+    )
     outline = generate_outline(all_sections)
 
     # Skip cover and table-of-contents sections (no need to review)
     _SKIP_TYPES = {"cover", "toc"}
     sections = [s for s in all_sections if s.section_type not in _SKIP_TYPES]
     skipped = [s.name for s in all_sections if s.section_type in _SKIP_TYPES]
-    total_batches = len(sections)
+    batches = _pack_sections(sections)
+    batch_names = [" / ".join(s.name for s in batch) for batch in batches]
+    total_batches = len(batches)
 
     logger.info(
-        "Detected %d sections, reviewing %d (skipped: %s): %s",
+        "Detected %d sections, reviewing %d in %d batches (skipped: %s): %s",
         len(all_sections),
+        len(sections),
         total_batches,
         skipped,
-        [s.name for s in sections],
+        batch_names,
     )
 
     # Signal that streaming has started with section info
@@ -272,65 +555,97 @@ async def review_paragraphs_stream(
             {
                 "current_batch": 0,
                 "total_batches": total_batches,
-                "message": f"已检测到 {len(all_sections)} 个章节，跳过封面/目录，评审 {total_batches} 个部分...",
+                "message": f"已检测到 {len(all_sections)} 个章节，跳过封面/目录，分 {total_batches} 批评审 {len(sections)} 个部分...",
             }
         ),
     }
 
-    # Step 2: Review each section
-    for batch_idx, section in enumerate(sections, 1):
-        section_label = f"{batch_idx}/{total_batches}: {section.name}"
-        logger.info("Reviewing section %s", section_label)
-
-        # Send progress event for this batch
-        yield {
-            "event": "progress",
-            "data": json.dumps(
-                {
-                    "current_batch": batch_idx,
-                    "total_batches": total_batches,
-                    "message": f"正在评审第 {section_label}",
-                }
-            ),
-        }
+    # Step 2: Review batches concurrently. Each batch streams into its
+    # own queue and the queues are drained in order, so batches after the
+    # current one are already under review while it is being streamed.
+    queues: list[asyncio.Queue] = []
+    jobs: list[tuple] = []
+    for batch_idx, (batch, batch_name) in enumerate(zip(batches, batch_names), 1):
+        queue: asyncio.Queue = asyncio.Queue()
+        queues.append(queue)
+
+        # Replay batches already reviewed for this document and model
+        cache_key = (
+            doc_hash,
+            batch[0].start_para_idx,
+            batch[-1].end_para_idx,
+            base_url,
+            model_name,
+        )
+        cached_events = _batch_events_cache.get(cache_key)
+        if cached_events is not None:
+            _batch_events_cache.move_to_end(cache_key)
+            logger.info("Replaying cached review of %s", batch_name)
+            for event in cached_events:
+                queue.put_nowait(event)
+            queue.put_nowait(None)
+            continue
 
-        # Build context-rich messages for this section
-        messages = build_section_review_messages(
-            section=section,
-            outline=outline,
-            batch_index=batch_idx,
-            total_batches=total_batches,
+        # Build context-rich messages for this batch
+        if len(batch) == 1:
+            messages = build_section_review_messages(
+                section=batch[0],
+                outline=outline,
+                batch_index=batch_idx,
+                total_batches=total_batches,
+            )
+        else:
+            messages = build_multi_section_review_messages(
+                sections=batch,
+                outline=outline,
+                batch_index=batch_idx,
+                total_batches=total_batches,
+            )
+        jobs.append(
+            (
+                f"{batch_idx}/{total_batches}: {batch_name}",
+                batch_name,
+                messages,
+                queue,
+                cache_key,
+            )
         )
 
-        try:
-            async for event_type, data in _stream_single_batch(
-                client, model_name, messages
-            ):
-                if event_type == "text":
-                    yield {
-                        "event": "text",
-                        "data": json.dumps({"content": data}),
-                    }
-                elif event_type == "comment":
-                    yield {
-                        "event": "comment",
-                        "data": data.model_dump_json(),
-                    }
+    # MAX_CONCURRENCY workers take batches in document order from a
+    # shared iterator, so earlier batches are always started first
+    pending_jobs = iter(jobs)
 
-        except Exception as e:
-            logger.error(
-                "LLM streaming review failed for section '%s': %s",
-                section.name,
-                e,
-            )
+    async def review_worker() -> None:
+        for job in pending_jobs:
+            await _review_batch(client, model_name, *job)
+
+    tasks = [
+        asyncio.create_task(review_worker())
+        for _ in range(min(MAX_CONCURRENCY, len(jobs)))
+    ]
+
+    try:
+        for batch_idx, (batch_name, queue) in enumerate(zip(batch_names, queues), 1):
+            # Send progress event for this batch
             yield {
-                "event": "error",
+                "event": "progress",
                 "data": json.dumps(
-                    {"message": f"评审 {section.name} 出错: {str(e)}"}
+                    {
+                        "current_batch": batch_idx,
+                        "total_batches": total_batches,
+                        "message": f"正在评审第 {batch_idx}/{total_batches}: {batch_name}",
+                    }
                 ),
             }
-            # Continue with next section rather than aborting entirely
-            continue
+
+            # A failed batch yields an error event and then its sentinel,
+            # so we continue with the next batch rather than aborting
+            while (event := await queue.get()) is not None:
+                yield event
+    finally:
+        # Stop outstanding reviews if the client disconnects mid-stream
+        for task in tasks:
+            task.cancel()
 
     # Signal completion
     yield {"event": "done", "data": "{}"}
@@ -356,10 +671,9 @@ async def generate_overall_comment_stream(
     Yields:
         Dict with 'event' and 'data' keys for SSE.
     """
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    client = _get_client(api_key, base_url)
 
-    para_dicts = [{"index": p.index, "text": p.text} for p in paragraphs]
-    messages = build_comment_messages(para_dicts)
+    messages = build_comment_messages(paragraphs)
 
     try:
         response = await client.chat.completions.create(
@@ -375,7 +689,7 @@ async def generate_overall_comment_stream(
             if delta.content:
                 yield {
                     "event": "text",
-                    "data": json.dumps({"content": delta.content}),
+                    "data": _text_event_data(delta.content),
                 }
 
     except Exception as e:
@@ -410,7 +724,7 @@ async def rewrite_text_stream(
     Yields:
         Dict with 'event' and 'data' keys for SSE.
     """
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+    client = _get_client(api_key, base_url)
 
     system_prompt = (
         "你是一位资深的学术论文写作专家，擅长将文本改写为规范、专业的学术语言。\n"
@@ -445,7 +759,7 @@ async def rewrite_text_stream(
             if delta.content:
                 yield {
                     "event": "text",
-                    "data": json.dumps({"content": delta.content}),
+                    "data": _text_event_data(delta.content),
                 }
 
     except Exception as e: